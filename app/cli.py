@@ -0,0 +1,348 @@
+import argparse
+import csv
+import io
+import json
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import islice
+
+from sqlalchemy import insert, select, text
+
+from app.database import SessionLocal, engine, Base
+from app.models import User, Article, Comment, Tag, Like, article_tags
+from app.stats import increment_stat, increment_author_stat, reconcile_stats
+from app.trending import rebuild_trending
+from app.related import rebuild_related
+from app.feeds import bump_content_version
+
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _read_batches(lines, batch_size):
+    numbered = enumerate(lines, start=1)
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _parse_article(line_no, line):
+    try:
+        data = json.loads(line)
+        if not isinstance(data, dict):
+            raise ValueError("ожидается объект")
+
+        title = data["title"]
+        content = data["content"]
+        author = data["author"]
+        for field, value in (("title", title), ("content", content), ("author", author)):
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError(f"поле {field} должно быть непустой строкой")
+
+        tags = data.get("tags") or []
+        if not isinstance(tags, list) or not all(isinstance(name, str) for name in tags):
+            raise ValueError("поле tags должно быть списком строк")
+        tags = [name.strip() for name in tags if name.strip()]
+
+        created_at = data.get("created_at")
+        if created_at is None:
+            created_at = datetime.now(timezone.utc)
+        elif isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        else:
+            raise ValueError("поле created_at должно быть строкой в формате ISO 8601")
+    except (ValueError, KeyError) as e:
+        raise ValueError(f"строка {line_no}: некорректная запись ({e})")
+
+    return {
+        "title": title,
+        "content": content,
+        "author": author,
+        "created_at": created_at,
+        "tags": list(dict.fromkeys(tags)),
+    }
+
+
+def _copy_rows(db, table, columns, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def _use_copy(db):
+    if db.bind.dialect.name != "postgresql":
+        return False
+    cursor = db.connection().connection.cursor()
+    try:
+        return hasattr(cursor, "copy_expert")
+    finally:
+        cursor.close()
+
+
+def _resolve_tags(db, names):
+    if not names:
+        return {}
+
+    tag_ids = dict(db.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+    missing = [name for name in names if name not in tag_ids]
+    if missing:
+        created = db.execute(
+            insert(Tag).returning(Tag.name, Tag.id, sort_by_parameter_order=True),
+            [{"name": name} for name in missing]
+        ).all()
+        tag_ids.update(dict(created))
+    return tag_ids
+
+
+def _insert_articles(db, rows, use_copy):
+    if use_copy:
+        ids = db.execute(
+            text("SELECT nextval(pg_get_serial_sequence('articles', 'id')) FROM generate_series(1, :n)"),
+            {"n": len(rows)}
+        ).scalars().all()
+        _copy_rows(db, "articles", ("id", "title", "content", "author_id", "created_at"), [
+            (article_id, row["title"], row["content"], row["author_id"], row["created_at"].isoformat())
+            for article_id, row in zip(ids, rows)
+        ])
+        return ids
+
+    return db.execute(
+        insert(Article).returning(Article.id, sort_by_parameter_order=True),
+        [
+            {
+                "title": row["title"],
+                "content": row["content"],
+                "author_id": row["author_id"],
+                "created_at": row["created_at"],
+            }
+            for row in rows
+        ]
+    ).scalars().all()
+
+
+def _insert_article_tags(db, links, use_copy):
+    if not links:
+        return
+    if use_copy:
+        _copy_rows(db, "article_tags", ("article_id", "tag_id"), links)
+    else:
+        db.execute(
+            article_tags.insert(),
+            [{"article_id": article_id, "tag_id": tag_id} for article_id, tag_id in links]
+        )
+
+
+def import_articles(db, lines, batch_size=DEFAULT_BATCH_SIZE, log=sys.stderr):
+    use_copy = _use_copy(db)
+    imported = 0
+    skipped = 0
+
+    for batch in _read_batches(lines, batch_size):
+        rows = []
+        for line_no, line in batch:
+            if not line.strip():
+                continue
+            try:
+                rows.append(_parse_article(line_no, line))
+            except ValueError as e:
+                print(e, file=log)
+                skipped += 1
+
+        usernames = {row["author"] for row in rows}
+        author_ids = dict(db.execute(select(User.username, User.id).where(User.username.in_(usernames))).all())
+
+        valid_rows = []
+        for row in rows:
+            author_id = author_ids.get(row["author"])
+            if author_id is None:
+                print(f"Автор не найден: {row['author']}", file=log)
+                skipped += 1
+                continue
+            row["author_id"] = author_id
+            valid_rows.append(row)
+
+        if not valid_rows:
+            continue
+
+        tag_names = list(dict.fromkeys(name for row in valid_rows for name in row["tags"]))
+        tag_ids = _resolve_tags(db, tag_names)
+
+        article_ids = _insert_articles(db, valid_rows, use_copy)
+        links = [
+            (article_id, tag_ids[name])
+            for article_id, row in zip(article_ids, valid_rows)
+            for name in row["tags"]
+        ]
+        _insert_article_tags(db, links, use_copy)
+
+        increment_stat(db, "articles", len(valid_rows))
+        for author_id, count in Counter(row["author_id"] for row in valid_rows).items():
+            increment_author_stat(db, author_id, "articles", count)
+        bump_content_version(db)
+        db.commit()
+
+        imported += len(valid_rows)
+        print(f"Импортировано статей: {imported}", file=log)
+
+    return imported, skipped
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _write(out, record):
+    out.write(json.dumps(record, ensure_ascii=False))
+    out.write("\n")
+
+
+def export_articles(db, out, batch_size=DEFAULT_BATCH_SIZE):
+    result = db.execute(
+        select(Article.id, Article.title, Article.content, Article.created_at, User.username)
+        .outerjoin(User, User.id == Article.author_id)
+        .order_by(Article.id)
+        .execution_options(yield_per=batch_size)
+    )
+    count = 0
+    for partition in result.partitions():
+        ids = [row.id for row in partition]
+        tags = {}
+        for article_id, name in db.execute(
+                select(article_tags.c.article_id, Tag.name)
+                .join(Tag, Tag.id == article_tags.c.tag_id)
+                .where(article_tags.c.article_id.in_(ids))
+        ):
+            tags.setdefault(article_id, []).append(name)
+
+        for row in partition:
+            _write(out, {
+                "id": row.id,
+                "title": row.title,
+                "content": row.content,
+                "author": row.username,
+                "created_at": _isoformat(row.created_at),
+                "tags": tags.get(row.id, []),
+            })
+        count += len(partition)
+    return count
+
+
+def export_comments(db, out, batch_size=DEFAULT_BATCH_SIZE):
+    result = db.execute(
+        select(Comment.id, Comment.article_id, Comment.content, Comment.created_at, User.username)
+        .outerjoin(User, User.id == Comment.author_id)
+        .order_by(Comment.id)
+        .execution_options(yield_per=batch_size)
+    )
+    count = 0
+    for row in result:
+        _write(out, {
+            "id": row.id,
+            "article_id": row.article_id,
+            "author": row.username,
+            "content": row.content,
+            "created_at": _isoformat(row.created_at),
+        })
+        count += 1
+    return count
+
+
+def export_likes(db, out, batch_size=DEFAULT_BATCH_SIZE):
+    result = db.execute(
+        select(Like.id, Like.article_id, Like.created_at, User.username)
+        .join(User, User.id == Like.user_id)
+        .order_by(Like.id)
+        .execution_options(yield_per=batch_size)
+    )
+    count = 0
+    for row in result:
+        _write(out, {
+            "id": row.id,
+            "article_id": row.article_id,
+            "user": row.username,
+            "created_at": _isoformat(row.created_at),
+        })
+        count += 1
+    return count
+
+
+EXPORTERS = {
+    "articles": export_articles,
+    "comments": export_comments,
+    "likes": export_likes,
+}
+
+
+def _open_input(path):
+    return sys.stdin if path == "-" else open(path, encoding="utf-8")
+
+
+def _open_output(path):
+    return sys.stdout if path == "-" else open(path, "w", encoding="utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Импорт и экспорт данных Мини-Блога")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import-articles", help="Импорт статей из NDJSON")
+    import_parser.add_argument("path", help="Файл NDJSON или - для stdin")
+    import_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    export_parser = subparsers.add_parser("export", help="Потоковый экспорт в NDJSON")
+    export_parser.add_argument("entity", choices=sorted(EXPORTERS))
+    export_parser.add_argument("-o", "--output", default="-", help="Файл NDJSON или - для stdout")
+    export_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    subparsers.add_parser("reconcile-stats", help="Пересчитать счетчики статистики сайта")
+    subparsers.add_parser("rebuild-trending", help="Пересчитать рейтинг трендов с нуля")
+    subparsers.add_parser("rebuild-related", help="Пересчитать индекс похожих статей с нуля")
+
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.command == "import-articles":
+            source = _open_input(args.path)
+            try:
+                imported, skipped = import_articles(db, source, args.batch_size)
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+            print(f"Готово: импортировано {imported}, пропущено {skipped}", file=sys.stderr)
+        elif args.command == "reconcile-stats":
+            values = reconcile_stats(db)
+            print("Готово: " + ", ".join(f"{name} {value}" for name, value in values.items()), file=sys.stderr)
+        elif args.command == "rebuild-trending":
+            count = rebuild_trending(db)
+            print(f"Готово: статей в трендах {count}", file=sys.stderr)
+        elif args.command == "rebuild-related":
+            count = rebuild_related(db)
+            print(f"Готово: связей между статьями {count}", file=sys.stderr)
+        else:
+            out = _open_output(args.output)
+            try:
+                count = EXPORTERS[args.entity](db, out, args.batch_size)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            print(f"Готово: экспортировано {count}", file=sys.stderr)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
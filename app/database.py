@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 load_dotenv()
@@ -12,17 +12,74 @@ if not DATABASE_URL:
     raise ValueError("DATABASE_URL не установлен в .env файле")
 
 
+# По умолчанию - с запасом ниже max_connections=100 PostgreSQL, чтобы оставались
+# соединения для миграций, psql и CLI.
+DEFAULT_CONNECTION_BUDGET = 80
+
+
+def get_connection_budget():
+    return int(os.getenv("DB_CONNECTION_BUDGET", str(DEFAULT_CONNECTION_BUDGET)))
+
+
+def get_pool_settings():
+    # DB_CONNECTION_BUDGET - общий лимит соединений на все воркеры (0 - без лимита);
+    # пул каждого воркера урезается до его доли, чтобы не перегружать PostgreSQL.
+    pool_size = int(os.getenv("DB_POOL_SIZE", "10"))
+    max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    budget = get_connection_budget()
+    if budget <= 0:
+        return pool_size, max_overflow
+
+    workers = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+    per_worker = max(budget // workers, 1)
+    if pool_size + max_overflow > per_worker:
+        pool_size = min(pool_size, max(per_worker // 2, 1))
+        max_overflow = per_worker - pool_size
+    return pool_size, max_overflow
+
+
+POOL_SIZE, MAX_OVERFLOW = get_pool_settings()
+
 engine = create_engine(
     DATABASE_URL,
 
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=30,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
     pool_recycle=1800,
     pool_pre_ping=True,
     echo=False
 )
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+CASCADE_TABLES = ("comments", "likes", "article_tags")
+_schema_cascades = None
+
+
+def schema_cascades() -> bool:
+    # Базы, созданные до ON DELETE CASCADE (create_all не меняет существующие
+    # таблицы), удаляют дочерние строки статьи явными DELETE.
+    global _schema_cascades
+    if _schema_cascades is None:
+        inspector = inspect(engine)
+        _schema_cascades = all(
+            any(
+                fk["referred_table"] == "articles"
+                and (fk.get("options") or {}).get("ondelete", "").upper() == "CASCADE"
+                for fk in inspector.get_foreign_keys(table)
+            )
+            for table in CASCADE_TABLES
+        )
+    return _schema_cascades
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -31,4 +88,32 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+class LazySession:
+    # Сессия создается при первом обращении, а release() возвращает соединение
+    # в пул сразу после работы с БД, не дожидаясь рендеринга и отправки ответа.
+    # Загруженные объекты после release() остаются доступны, но ленивые связи
+    # у них уже не подгрузятся - все нужное шаблону загружается заранее.
+    def __init__(self, factory=SessionLocal):
+        self._factory = factory
+        self._session = None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = self._factory()
+        return getattr(self._session, name)
+
+    def release(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+def get_lazy_db():
+    db = LazySession()
+    try:
+        yield db
+    finally:
+        db.release()
\ No newline at end of file
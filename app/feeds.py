@@ -0,0 +1,259 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import timezone
+from email.utils import format_datetime
+from typing import Callable, Iterator, Optional
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from fastapi import Request
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from starlette.responses import Response, StreamingResponse
+
+from app.database import SessionLocal
+from app.models import Article, SiteStat, Tag, User, article_tags
+from app.stats import increment_stat, insert_missing_stats
+
+
+SITE_URL = os.getenv("SITE_URL", "")
+FEED_SIZE = int(os.getenv("FEED_SIZE", "50"))
+SITEMAP_CHUNK_SIZE = int(os.getenv("SITEMAP_CHUNK_SIZE", "50000"))
+FEED_CACHE_ENTRIES = int(os.getenv("FEED_CACHE_ENTRIES", "64"))
+FEED_MAX_AGE = int(os.getenv("FEED_MAX_AGE", "300"))
+STREAM_BATCH_SIZE = 1000
+
+# Версия контента (строка content_version в site_stats) растет при каждом изменении
+# статей и входит в ключ кэша и ETag: все ленты и sitemap инвалидируются разом.
+CONTENT_VERSION_STAT = "content_version"
+
+
+def bump_content_version(db: Session):
+    increment_stat(db, CONTENT_VERSION_STAT)
+
+
+def get_content_version(db: Session) -> int:
+    stat = db.get(SiteStat, CONTENT_VERSION_STAT)
+    return stat.value if stat else 0
+
+
+def ensure_content_version(db: Session):
+    insert_missing_stats(db, {CONTENT_VERSION_STAT: 1})
+
+
+def tag_exists(db: Session, tag: str) -> bool:
+    return db.query(Tag.id).filter(Tag.name == tag).first() is not None
+
+
+def sitemap_chunk_count(db: Session) -> int:
+    max_id = db.query(func.max(Article.id)).scalar() or 0
+    return max_id // SITEMAP_CHUNK_SIZE + 1
+
+
+class FeedCache:
+    # Готовые документы хранятся вместе с версией контента, для которой они
+    # построены; при смене версии запись просто перестает совпадать.
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, version: int, body: bytes):
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def capture(self, key: str, version: int, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self.set(key, version, b"".join(parts))
+
+
+feed_cache = FeedCache(FEED_CACHE_ENTRIES)
+
+
+def site_url(request: Request) -> str:
+    # Без SITE_URL адрес берется из заголовка Host, поэтому он экранируется
+    # сразу: дальше к нему дописываются только id и закодированные имена тегов.
+    return escape((SITE_URL or str(request.base_url)).rstrip("/"), {'"': "&quot;"})
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # Для If-None-Match достаточно слабого сравнения: сжатый ответ приходит с W/.
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def feed_response(
+        request: Request,
+        key: str,
+        version: int,
+        media_type: str,
+        generate: Callable[[], Iterator[bytes]]
+) -> Response:
+    etag = '"%s-%d"' % (hashlib.md5(key.encode("utf-8")).hexdigest()[:16], version)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={FEED_MAX_AGE}"}
+
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+
+    # Документы с адресом из заголовка Host не кэшируются: иначе любой клиент
+    # мог бы забить кэш вариантами с произвольными Host.
+    if not SITE_URL:
+        return StreamingResponse(generate(), media_type=media_type, headers=headers)
+
+    body = feed_cache.get(key, version)
+    if body is not None:
+        return Response(body, media_type=media_type, headers=headers)
+
+    return StreamingResponse(feed_cache.capture(key, version, generate()), media_type=media_type, headers=headers)
+
+
+def _buffered(pieces: Iterator[str], size: int = 65536) -> Iterator[bytes]:
+    buffer = []
+    buffered = 0
+    for piece in pieces:
+        data = piece.encode("utf-8")
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= size:
+            yield b"".join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _fetch(statement) -> list:
+    # Строки (не больше FEED_SIZE или SITEMAP_CHUNK_SIZE коротких кортежей) читаются
+    # серверным курсором целиком до начала отправки: медленный клиент не держит
+    # соединение из пула, пока ему уходит документ.
+    db = SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+        return result.all()
+    finally:
+        db.close()
+
+
+def _utc(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _feed_statement(tag: Optional[str]):
+    statement = (
+        select(Article.id, Article.title, Article.content, Article.created_at, User.username)
+        .outerjoin(User, User.id == Article.author_id)
+        .order_by(Article.created_at.desc(), Article.id.desc())
+        .limit(FEED_SIZE)
+    )
+    if tag:
+        statement = (
+            statement
+            .join(article_tags, article_tags.c.article_id == Article.id)
+            .join(Tag, Tag.id == article_tags.c.tag_id)
+            .where(Tag.name == tag)
+        )
+    return statement
+
+
+def _summary(content: str) -> str:
+    return content if len(content) <= 500 else content[:500] + "..."
+
+
+def generate_rss(base_url: str, tag: Optional[str] = None) -> Iterator[bytes]:
+    def pieces():
+        title = "Мини-Блог" + (f" - {tag}" if tag else "")
+        link = f"{base_url}/articles" + (f"?tag={quote(tag, safe='')}" if tag else "")
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel>'
+        yield f"<title>{escape(title)}</title><link>{link}</link>"
+        yield "<description>Платформа для создания и обмена статьями</description>"
+        for row in _fetch(_feed_statement(tag)):
+            url = f"{base_url}/articles/{row.id}"
+            yield (
+                f"<item><title>{escape(row.title)}</title>"
+                f"<link>{url}</link><guid>{url}</guid>"
+                f"<pubDate>{format_datetime(_utc(row.created_at))}</pubDate>"
+                + (f"<author>{escape(row.username)}</author>" if row.username else "")
+                + f"<description>{escape(_summary(row.content))}</description></item>"
+            )
+        yield "</channel></rss>"
+
+    return _buffered(pieces())
+
+
+def generate_atom(base_url: str, tag: Optional[str] = None) -> Iterator[bytes]:
+    def pieces():
+        title = "Мини-Блог" + (f" - {tag}" if tag else "")
+        link = f"{base_url}/articles" + (f"?tag={quote(tag, safe='')}" if tag else "")
+        header_written = False
+        for row in _fetch(_feed_statement(tag)):
+            if not header_written:
+                yield from _atom_header(title, link, _utc(row.created_at).isoformat())
+                header_written = True
+            url = f"{base_url}/articles/{row.id}"
+            yield (
+                f'<entry><title>{escape(row.title)}</title><link href="{url}"/><id>{url}</id>'
+                f"<updated>{_utc(row.created_at).isoformat()}</updated>"
+                f"<author><name>{escape(row.username or 'Неизвестный автор')}</name></author>"
+                f"<summary>{escape(_summary(row.content))}</summary></entry>"
+            )
+        if not header_written:
+            yield from _atom_header(title, link, "1970-01-01T00:00:00+00:00")
+        yield "</feed>"
+
+    return _buffered(pieces())
+
+
+def _atom_header(title: str, link: str, updated: str) -> Iterator[str]:
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">'
+    yield f'<title>{escape(title)}</title><link href="{link}"/><id>{link}</id>'
+    yield f"<updated>{updated}</updated>"
+
+
+def generate_sitemap_index(base_url: str, chunks: int) -> Iterator[bytes]:
+    def pieces():
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        for chunk in range(chunks):
+            yield f"<sitemap><loc>{base_url}/sitemap-{chunk}.xml</loc></sitemap>"
+        yield "</sitemapindex>"
+
+    return _buffered(pieces())
+
+
+def generate_sitemap_chunk(base_url: str, chunk: int) -> Iterator[bytes]:
+    # Части sitemap - диапазоны id, так что каждая читается одним проходом по индексу.
+    def pieces():
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        if chunk == 0:
+            yield f"<url><loc>{base_url}/</loc></url><url><loc>{base_url}/articles</loc></url>"
+
+        statement = (
+            select(Article.id, Article.created_at)
+            .where(Article.id >= chunk * SITEMAP_CHUNK_SIZE, Article.id < (chunk + 1) * SITEMAP_CHUNK_SIZE)
+            .order_by(Article.id)
+        )
+        for row in _fetch(statement):
+            lastmod = f"<lastmod>{_utc(row.created_at).date().isoformat()}</lastmod>" if row.created_at else ""
+            yield f"<url><loc>{base_url}/articles/{row.id}</loc>{lastmod}</url>"
+        yield "</urlset>"
+
+    return _buffered(pieces())
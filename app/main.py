@@ -1,19 +1,40 @@
 from fastapi import FastAPI, Depends, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+import asyncio
 import os
 from dotenv import load_dotenv
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, TimeoutError as PoolTimeoutError
 
-from app.database import get_db, engine, Base
-from app.models import User, Article, Comment, Tag, Like
+from app.database import (
+    get_db, get_lazy_db, LazySession, engine, Base, SessionLocal, POOL_SIZE, MAX_OVERFLOW, schema_cascades
+)
+from app.models import User, Article, Comment, Tag, Like, article_tags
 from app.schemas import *
-from sqlalchemy import and_, func
+from app.streaming import StreamingTemplateResponse
+from app.compression import CompressionMiddleware
+from app.ratelimit import RateLimiter, AdmissionController
+from app.related import get_related_articles, update_tag_links, update_like_links
+from app.feeds import (
+    site_url, feed_response, bump_content_version, get_content_version, ensure_content_version,
+    tag_exists, sitemap_chunk_count, generate_rss, generate_atom, generate_sitemap_index,
+    generate_sitemap_chunk
+)
+from app.trending import (
+    TRENDING_DECAY_INTERVAL, LIKE_WEIGHT, COMMENT_WEIGHT, add_trending_activity,
+    decay_trending_periodically, ensure_trending
+)
+from app.stats import (
+    STATS_RECONCILE_INTERVAL, ensure_stats, get_site_stats, increment_stat,
+    invalidate_stats_cache, reconcile_stats_periodically, get_author_stats,
+    increment_author_stat
+)
+from sqlalchemy import and_, func, delete, select, literal, union_all
 
 load_dotenv()
 
@@ -24,15 +45,89 @@ Base.metadata.create_all(bind=engine)
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+PROFILE_PAGE_SIZE = 10
+# Не больше стольких статей за один запрос: список id уходит в IN (...)
+# и не должен упираться в лимит параметров запроса SQLite.
+BULK_DELETE_LIMIT = 500
+MODERATORS = {name.strip() for name in os.getenv("MODERATORS", "").split(",") if name.strip()}
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "500"))
+
+RATE_LIMITS = {
+    "login": os.getenv("RATE_LIMIT_LOGIN", "10/minute"),
+    "register": os.getenv("RATE_LIMIT_REGISTER", "5/minute"),
+    "article": os.getenv("RATE_LIMIT_ARTICLE", "10/minute"),
+    "comment": os.getenv("RATE_LIMIT_COMMENT", "30/minute"),
+    "like": os.getenv("RATE_LIMIT_LIKE", "60/minute"),
+}
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", str(POOL_SIZE + MAX_OVERFLOW)))
+ADMISSION_TIMEOUT = float(os.getenv("ADMISSION_TIMEOUT", "1"))
 
 app = FastAPI(title="Мини-Блог")
 
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/login")
 
+background_tasks = set()
+
+
+@app.on_event("startup")
+async def start_stats():
+    db = SessionLocal()
+    try:
+        ensure_stats(db)
+        ensure_content_version(db)
+    finally:
+        db.close()
+
+    if STATS_RECONCILE_INTERVAL > 0:
+        task = asyncio.create_task(reconcile_stats_periodically())
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+
+@app.on_event("startup")
+async def start_trending():
+    db = SessionLocal()
+    try:
+        ensure_trending(db)
+    finally:
+        db.close()
+
+    if TRENDING_DECAY_INTERVAL > 0:
+        task = asyncio.create_task(decay_trending_periodically())
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+
+def get_token_username(request: Request, token: Optional[str] = None) -> Optional[str]:
+    if not token:
+        token = request.cookies.get("access_token")
+
+    if not token:
+        return None
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
+rate_limiter = RateLimiter(user_key=get_token_username)
+admission = AdmissionController(engine, ADMISSION_MAX_CONCURRENT, ADMISSION_TIMEOUT)
+
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    return JSONResponse(
+        {"detail": "Сервер перегружен, попробуйте позже"},
+        status_code=503,
+        headers={"Retry-After": "1"}
+    )
 
 
 def create_access_token(data: dict):
@@ -48,30 +143,120 @@ async def get_current_user(
         token: Optional[str] = None,
         db: Session = Depends(get_db)
 ):
-
-    if not token:
-        token = request.cookies.get("access_token")
-
-    if not token:
-        return None
-
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-    except JWTError:
+    username = get_token_username(request, token)
+    if username is None:
         return None
 
     user = db.query(User).filter(User.username == username).first()
     return user
 
 
+def is_moderator(user) -> bool:
+    return bool(user) and user.username in MODERATORS
+
+
+def delete_articles(db: Session, article_ids: List[int], author_id: Optional[int] = None) -> int:
+    query = select(Article.id).where(Article.id.in_(article_ids))
+    if author_id is not None:
+        query = query.where(Article.author_id == author_id)
+    ids = db.execute(query).scalars().all()
+    if not ids:
+        return 0
+
+    articles_by_author = dict(db.execute(
+        select(Article.author_id, func.count(Article.id))
+        .where(Article.id.in_(ids))
+        .group_by(Article.author_id)
+    ).all())
+    likes_by_author = dict(db.execute(
+        select(Article.author_id, func.count(Like.id))
+        .join(Like, Like.article_id == Article.id)
+        .where(Article.id.in_(ids))
+        .group_by(Article.author_id)
+    ).all())
+    comments_by_author = dict(db.execute(
+        select(Article.author_id, func.count(Comment.id))
+        .join(Comment, Comment.article_id == Article.id)
+        .where(Article.id.in_(ids))
+        .group_by(Article.author_id)
+    ).all())
+
+    # Комментарии, лайки и связи с тегами удаляет сама БД (ON DELETE CASCADE);
+    # в старой схеме без каскадов - явными DELETE до удаления статей.
+    if not schema_cascades():
+        for table in (Comment.__table__, Like.__table__, article_tags):
+            db.execute(delete(table).where(table.c.article_id.in_(ids)))
+    db.execute(delete(Article).where(Article.id.in_(ids)))
+    increment_stat(db, "articles", -len(ids))
+    increment_stat(db, "comments", -sum(comments_by_author.values()))
+    increment_stat(db, "likes", -sum(likes_by_author.values()))
+    for author_id, count in articles_by_author.items():
+        increment_author_stat(db, author_id, "articles", -count)
+        increment_author_stat(db, author_id, "likes", -likes_by_author.get(author_id, 0))
+        increment_author_stat(db, author_id, "comments", -comments_by_author.get(author_id, 0))
+    bump_content_version(db)
+    db.commit()
+    invalidate_stats_cache()
+
+    return len(ids)
+
+
+def get_article_counts(db: Session, article_ids: List[int]) -> dict:
+    if not article_ids:
+        return {}
+
+    activity = union_all(
+        select(Like.article_id.label("article_id"), literal(1).label("likes"), literal(0).label("comments"))
+        .where(Like.article_id.in_(article_ids)),
+        select(Comment.article_id, literal(0), literal(1))
+        .where(Comment.article_id.in_(article_ids)),
+    ).subquery()
+
+    rows = db.execute(
+        select(activity.c.article_id, func.sum(activity.c.likes), func.sum(activity.c.comments))
+        .group_by(activity.c.article_id)
+    ).all()
+    return {article_id: (likes, comments) for article_id, likes, comments in rows}
+
+
+def get_profile_context(db: Session, user: User, page: int = 1) -> dict:
+    summary = get_author_stats(db, user.id)
+    total_pages = max((summary.articles + PROFILE_PAGE_SIZE - 1) // PROFILE_PAGE_SIZE, 1)
+    page = min(max(page, 1), total_pages)
+
+    user_articles = (
+        db.query(Article)
+        .options(selectinload(Article.tags))
+        .filter(Article.author_id == user.id)
+        .order_by(Article.created_at.desc(), Article.id.desc())
+        .offset((page - 1) * PROFILE_PAGE_SIZE)
+        .limit(PROFILE_PAGE_SIZE)
+        .all()
+    )
+
+    counts = get_article_counts(db, [article.id for article in user_articles])
+    for article in user_articles:
+        article.likes_count, article.comments_count = counts.get(article.id, (0, 0))
+
+    return {
+        "current_user": user,
+        "user_articles": user_articles,
+        "summary": summary,
+        "current_page": page,
+        "total_pages": total_pages,
+    }
+
+
 @app.get("/", response_class=HTMLResponse)
-async def home_page(request: Request, db: Session = Depends(get_db)):
+async def home_page(request: Request, sort: Optional[str] = "newest", db: LazySession = Depends(get_lazy_db)):
     current_user = await get_current_user(request, db=db)
 
-    articles = db.query(Article).order_by(Article.created_at.desc()).limit(5).all()
+    query = db.query(Article).options(selectinload(Article.tags))
+    if sort == "trending":
+        query = query.order_by(Article.trending_score.desc(), Article.id.desc())
+    else:
+        query = query.order_by(Article.created_at.desc())
+    articles = query.limit(5).all()
 
     for article in articles:
         article.author = db.query(User).filter(User.id == article.author.id).first()
@@ -83,22 +268,25 @@ async def home_page(request: Request, db: Session = Depends(get_db)):
 
     tags = db.query(Tag).limit(10).all()
 
-    total_likes = db.query(Like).count()
+    stats = get_site_stats(db)
+    db.release()
 
     return templates.TemplateResponse("index.html", {
         "request": request,
         "current_user": current_user,
         "articles": articles,
         "tags": tags,
-        "total_likes": total_likes,
+        "stats": stats,
+        "current_sort": sort,
     })
 
 
 @app.get("/login", response_class=HTMLResponse)
-async def login_page(request: Request, db: Session = Depends(get_db)):
+async def login_page(request: Request, db: LazySession = Depends(get_lazy_db)):
     current_user = await get_current_user(request, db=db)
     if current_user:
         return RedirectResponse("/", status_code=303)
+    db.release()
 
     return templates.TemplateResponse("login.html", {
         "request": request
@@ -106,10 +294,11 @@ async def login_page(request: Request, db: Session = Depends(get_db)):
 
 
 @app.get("/register", response_class=HTMLResponse)
-async def register_page(request: Request, db: Session = Depends(get_db)):
+async def register_page(request: Request, db: LazySession = Depends(get_lazy_db)):
     current_user = await get_current_user(request, db=db)
     if current_user:
         return RedirectResponse("/", status_code=303)
+    db.release()
 
     return templates.TemplateResponse("register.html", {
         "request": request
@@ -123,13 +312,13 @@ async def articles_page(
         search: Optional[str] = None,
         tag: Optional[str] = None,
         sort: Optional[str] = "newest",
-        db: Session = Depends(get_db)
+        db: LazySession = Depends(get_lazy_db)
 ):
     current_user = await get_current_user(request, db=db)
     limit = 10
     offset = (page - 1) * limit
 
-    query = db.query(Article)
+    query = db.query(Article).options(selectinload(Article.tags))
 
     if search:
         query = query.filter(
@@ -145,6 +334,8 @@ async def articles_page(
         query = query.order_by(Article.created_at.desc())
     elif sort == "oldest":
         query = query.order_by(Article.created_at.asc())
+    elif sort == "trending":
+        query = query.order_by(Article.trending_score.desc(), Article.id.desc())
     elif sort == "popular":
         articles = query.all()
         articles_with_likes = []
@@ -173,6 +364,7 @@ async def articles_page(
             articles.append(article)
 
         tags = db.query(Tag).all()
+        db.release()
 
         return templates.TemplateResponse("articles.html", {
             "request": request,
@@ -199,6 +391,7 @@ async def articles_page(
             article.is_liked = bool(existing_like)
 
     tags = db.query(Tag).all()
+    db.release()
 
     total_pages = (total_articles + limit - 1) // limit
 
@@ -216,7 +409,10 @@ async def articles_page(
 
 
 
-@app.post("/api/articles")
+@app.post("/api/articles", dependencies=[
+    Depends(rate_limiter.limit("article", RATE_LIMITS["article"])),
+    Depends(admission.admit())
+])
 async def create_article_api(
         request: Request,
         title: str = Form(...),
@@ -244,7 +440,13 @@ async def create_article_api(
         db_article.tags.append(tag)
 
     db.add(db_article)
+    db.flush()
+    update_tag_links(db, db_article.id, [tag.id for tag in db_article.tags])
+    increment_stat(db, "articles")
+    increment_author_stat(db, current_user.id, "articles")
+    bump_content_version(db)
     db.commit()
+    invalidate_stats_cache()
 
     return RedirectResponse(f"/articles/{db_article.id}", status_code=303)
 @app.get("/articles/new", response_class=HTMLResponse)
@@ -272,22 +474,20 @@ async def create_article_page(
 async def article_detail_page(
         request: Request,
         article_id: int,
-        db: Session = Depends(get_db)
+        db: LazySession = Depends(get_lazy_db)
 ):
     current_user = await get_current_user(request, db=db)
 
-    article = db.query(Article).filter(Article.id == article_id).first()
+    article = db.query(Article).options(selectinload(Article.tags)).filter(Article.id == article_id).first()
     if not article:
+        db.release()
         return templates.TemplateResponse("404.html", {
             "request": request,
             "current_user": current_user
         }, status_code=404)
 
     article.author = db.query(User).filter(User.id == article.author_id).first()
-    comments = db.query(Comment).filter(Comment.article_id == article_id).all()
-
-    for comment in comments:
-        comment.author = db.query(User).filter(User.id == comment.author_id).first()
+    comments = db.query(Comment).options(joinedload(Comment.author)).filter(Comment.article_id == article_id).all()
 
     tags = article.tags if hasattr(article, "tags") else []
 
@@ -297,14 +497,18 @@ async def article_detail_page(
         existing_like = db.query(Like).filter(and_(Like.user_id == current_user.id, Like.article_id == article_id)).first()
         is_liked = bool(existing_like)
 
-    return templates.TemplateResponse("article_detail.html", {
+    related_articles = get_related_articles(db, article_id)
+    db.release()
+
+    return StreamingTemplateResponse(templates, "article_detail.html", {
         "request": request,
         "current_user": current_user,
         "article": article,
         "comments": comments,
         "tags": tags,
         "likes_count": likes_count,
-        "is_liked": is_liked
+        "is_liked": is_liked,
+        "related_articles": related_articles
     })
 
 
@@ -312,21 +516,24 @@ async def article_detail_page(
 
 
 @app.get("/profile", response_class=HTMLResponse)
-async def profile_page(request: Request, db: Session = Depends(get_db)):
+async def profile_page(request: Request, page: int = 1, db: LazySession = Depends(get_lazy_db)):
     current_user = await get_current_user(request, db=db)
     if not current_user:
         return RedirectResponse("/login", status_code=303)
 
-    user_articles = db.query(Article).filter(Article.author_id == current_user.id).all()
+    context = get_profile_context(db, current_user, page)
+    db.release()
 
     return templates.TemplateResponse("profile.html", {
         "request": request,
-        "current_user": current_user,
-        "user_articles": user_articles
+        **context
     })
 
 
-@app.post("/api/register")
+@app.post("/api/register", dependencies=[
+    Depends(rate_limiter.limit("register", RATE_LIMITS["register"])),
+    Depends(admission.admit())
+])
 async def register_user(
         request: Request,
         username: str = Form(...),
@@ -357,7 +564,9 @@ async def register_user(
     )
 
     db.add(db_user)
+    increment_stat(db, "users")
     db.commit()
+    invalidate_stats_cache()
     db.refresh(db_user)
 
     access_token = create_access_token(data={"sub": db_user.username})
@@ -367,7 +576,10 @@ async def register_user(
     return response
 
 
-@app.post("/api/login")
+@app.post("/api/login", dependencies=[
+    Depends(rate_limiter.limit("login", RATE_LIMITS["login"])),
+    Depends(admission.admit())
+])
 async def login_user(
         request: Request,
         username: str = Form(...),
@@ -396,7 +608,10 @@ async def logout():
     return response
 
 
-@app.post("/api/articles/{article_id}/comments")
+@app.post("/api/articles/{article_id}/comments", dependencies=[
+    Depends(rate_limiter.limit("comment", RATE_LIMITS["comment"])),
+    Depends(admission.admit())
+])
 async def create_comment_api(
         request: Request,
         article_id: int,
@@ -418,7 +633,11 @@ async def create_comment_api(
     )
 
     db.add(db_comment)
+    add_trending_activity(db, article_id, COMMENT_WEIGHT)
+    increment_author_stat(db, article.author_id, "comments")
+    increment_stat(db, "comments")
     db.commit()
+    invalidate_stats_cache()
 
     return RedirectResponse(f"/articles/{article_id}", status_code=303)
 
@@ -433,11 +652,32 @@ async def delete_article_api(
     if not current_user:
         return RedirectResponse("/login", status_code=303)
 
-    article = db.query(Article).filter(Article.id == article_id).first()
+    author_id = None if is_moderator(current_user) else current_user.id
+    delete_articles(db, [article_id], author_id=author_id)
 
-    if article and article.author_id == current_user.id:
-        db.delete(article)
-        db.commit()
+    return RedirectResponse("/profile", status_code=303)
+
+
+@app.post("/api/articles/bulk-delete")
+async def bulk_delete_articles_api(
+        request: Request,
+        article_ids: List[int] = Form([]),
+        db: Session = Depends(get_db)
+):
+    current_user = await get_current_user(request, db=db)
+    if not current_user:
+        return RedirectResponse("/login", status_code=303)
+
+    article_ids = list(dict.fromkeys(article_ids))
+    if len(article_ids) > BULK_DELETE_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"За один раз можно удалить не больше {BULK_DELETE_LIMIT} статей"
+        )
+
+    if article_ids:
+        author_id = None if is_moderator(current_user) else current_user.id
+        delete_articles(db, article_ids, author_id=author_id)
 
     return RedirectResponse("/profile", status_code=303)
 
@@ -459,13 +699,13 @@ async def update_profile(
     if not current_user.verify_password(current_password):
         return templates.TemplateResponse("profile.html", {
             "request": request,
-            "current_user": current_user,
-            "user_articles": db.query(Article).filter(Article.author_id == current_user.id).all(),
+            **get_profile_context(db, current_user),
             "error": "Неверный текущий пароль"
         })
 
     try:
-        if username != current_user.username:
+        username_changed = username != current_user.username
+        if username_changed:
             current_user.username = username
 
         if email != current_user.email:
@@ -476,6 +716,9 @@ async def update_profile(
         if new_password:
             current_user.hashed_password = User.hash_password(new_password)
 
+        # Имя автора выводится в RSS и Atom: ленты с ним инвалидируются.
+        if username_changed:
+            bump_content_version(db)
         db.commit()
 
         if username != current_user.username:
@@ -498,12 +741,14 @@ async def update_profile(
 
         return templates.TemplateResponse("profile.html", {
             "request": request,
-            "current_user": current_user,
-            "user_articles": db.query(Article).filter(Article.author_id == current_user.id).all(),
+            **get_profile_context(db, current_user),
             "error": error_msg
         })
 
-@app.post("/api/articles/{article_id}/like")
+@app.post("/api/articles/{article_id}/like", dependencies=[
+    Depends(rate_limiter.limit("like", RATE_LIMITS["like"])),
+    Depends(admission.admit())
+])
 async def like_article(
         request: Request,
         article_id: int,
@@ -522,11 +767,20 @@ async def like_article(
 
     if existing_like:
         db.delete(existing_like)
+        add_trending_activity(db, article_id, -LIKE_WEIGHT, at=existing_like.created_at)
+        update_like_links(db, article_id, current_user.id, sign=-1)
+        increment_author_stat(db, article.author_id, "likes", -1)
+        increment_stat(db, "likes", -1)
         db.commit()
     else:
         like = Like(user_id=current_user.id, article_id=article_id)
         db.add(like)
+        add_trending_activity(db, article_id, LIKE_WEIGHT)
+        update_like_links(db, article_id, current_user.id)
+        increment_author_stat(db, article.author_id, "likes")
+        increment_stat(db, "likes")
         db.commit()
+    invalidate_stats_cache()
     return RedirectResponse(f"/articles/{article_id}", status_code=303)
 
 
@@ -539,6 +793,87 @@ async def get_article_likes_count(
     return {"likes_count": count}
 
 
+def get_feed_version(db: LazySession, tag: Optional[str]) -> int:
+    # Несуществующие теги и части sitemap - 404: иначе обход произвольных
+    # адресов заполнял бы кэш пустыми документами и вытеснял настоящие.
+    if tag and not tag_exists(db, tag):
+        raise HTTPException(status_code=404, detail="Тег не найден")
+    version = get_content_version(db)
+    db.release()
+    return version
+
+
+# Ленты и sitemap отдаются из кэша по версии контента и не трогают HTML-страницы.
+@app.get("/feed.xml")
+async def rss_feed(
+        request: Request,
+        tag: Optional[str] = None,
+        db: LazySession = Depends(get_lazy_db)
+):
+    version = get_feed_version(db, tag)
+    base_url = site_url(request)
+    return feed_response(
+        request, f"rss:{base_url}:{tag or ''}", version, "application/rss+xml; charset=utf-8",
+        lambda: generate_rss(base_url, tag)
+    )
+
+
+@app.get("/atom.xml")
+async def atom_feed(
+        request: Request,
+        tag: Optional[str] = None,
+        db: LazySession = Depends(get_lazy_db)
+):
+    version = get_feed_version(db, tag)
+    base_url = site_url(request)
+    return feed_response(
+        request, f"atom:{base_url}:{tag or ''}", version, "application/atom+xml; charset=utf-8",
+        lambda: generate_atom(base_url, tag)
+    )
+
+
+@app.get("/tags/{tag}/feed.xml")
+async def tag_rss_feed(
+        request: Request,
+        tag: str,
+        db: LazySession = Depends(get_lazy_db)
+):
+    return await rss_feed(request, tag=tag, db=db)
+
+
+@app.get("/sitemap.xml")
+async def sitemap_index(
+        request: Request,
+        db: LazySession = Depends(get_lazy_db)
+):
+    version = get_content_version(db)
+    chunks = sitemap_chunk_count(db)
+    db.release()
+    base_url = site_url(request)
+    return feed_response(
+        request, f"sitemap:{base_url}", version, "application/xml; charset=utf-8",
+        lambda: generate_sitemap_index(base_url, chunks)
+    )
+
+
+@app.get("/sitemap-{chunk}.xml")
+async def sitemap_chunk(
+        request: Request,
+        chunk: int,
+        db: LazySession = Depends(get_lazy_db)
+):
+    if chunk < 0 or chunk >= sitemap_chunk_count(db):
+        raise HTTPException(status_code=404, detail="Страница не найдена")
+
+    version = get_content_version(db)
+    db.release()
+    base_url = site_url(request)
+    return feed_response(
+        request, f"sitemap:{base_url}:{chunk}", version, "application/xml; charset=utf-8",
+        lambda: generate_sitemap_chunk(base_url, chunk)
+    )
+
+
 @app.get("/articles/{article_id}/edit")
 async def edit_article_page(
         request: Request,
@@ -599,6 +934,7 @@ async def edit_article(
     article.content = content
     article.updated_at = datetime.now()
 
+    old_tag_ids = {tag.id for tag in article.tags}
     article.tags.clear()
 
     for tag_name in tag_names:
@@ -608,7 +944,13 @@ async def edit_article(
                 tag = Tag(name=tag_name.strip())
                 db.add(tag)
                 db.flush()
-            article.tags.append(tag)
+            if tag not in article.tags:
+                article.tags.append(tag)
+
+    new_tag_ids = {tag.id for tag in article.tags}
+    update_tag_links(db, article.id, old_tag_ids - new_tag_ids, sign=-1)
+    update_tag_links(db, article.id, new_tag_ids - old_tag_ids)
+    bump_content_version(db)
 
     db.commit()
 
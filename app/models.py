@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Table, UniqueConstraint
+from sqlalchemy import Column, Integer, Float, String, Text, DateTime, ForeignKey, Table, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from passlib.context import CryptContext
@@ -12,8 +12,10 @@ pwd_context = CryptContext(
 )
 
 article_tags = Table('article_tags', Base.metadata,
-                     Column('article_id', Integer, ForeignKey('articles.id')),
-                     Column('tag_id', Integer, ForeignKey('tags.id'))
+                     Column('article_id', Integer, ForeignKey('articles.id', ondelete='CASCADE')),
+                     Column('tag_id', Integer, ForeignKey('tags.id', ondelete='CASCADE')),
+                     Index('ix_article_tags_tag_id_article_id', 'tag_id', 'article_id'),
+                     Index('ix_article_tags_article_id_tag_id', 'article_id', 'tag_id')
                      )
 
 
@@ -59,7 +61,7 @@ class Like(Base):
     __tablename__ = "likes"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    article_id = Column(Integer, ForeignKey("articles.id"), nullable=False)
+    article_id = Column(Integer, ForeignKey("articles.id", ondelete="CASCADE"), nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     __table_args__ = (
@@ -76,13 +78,18 @@ class Article(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     content = Column(Text, nullable=False)
-    author_id = Column(Integer, ForeignKey("users.id"))
+    author_id = Column(Integer, ForeignKey("users.id"), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    trending_score = Column(Float, nullable=False, default=0.0, server_default="0")
+
+    __table_args__ = (
+        Index('ix_articles_trending_score', 'trending_score', 'id'),
+    )
 
     author = relationship("User", back_populates="articles")
-    comments = relationship("Comment", back_populates="article")
-    tags = relationship("Tag", secondary=article_tags, back_populates="articles")
-    likes = relationship("Like")
+    comments = relationship("Comment", back_populates="article", cascade="all, delete-orphan", passive_deletes=True)
+    tags = relationship("Tag", secondary=article_tags, back_populates="articles", passive_deletes=True)
+    likes = relationship("Like", cascade="all, delete-orphan", passive_deletes=True)
     @property
     def like_count(self):
         return len(self.likes) if self.likes else 0
@@ -98,7 +105,7 @@ class Comment(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
-    article_id = Column(Integer, ForeignKey("articles.id"))
+    article_id = Column(Integer, ForeignKey("articles.id", ondelete="CASCADE"), index=True)
     author_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -115,3 +122,30 @@ class Tag(Base):
     articles = relationship("Article", secondary=article_tags, back_populates="tags")
 
 
+class SiteStat(Base):
+    __tablename__ = "site_stats"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class AuthorStat(Base):
+    __tablename__ = "author_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    articles = Column(Integer, nullable=False, default=0)
+    likes = Column(Integer, nullable=False, default=0)
+    comments = Column(Integer, nullable=False, default=0)
+
+
+class RelatedArticle(Base):
+    __tablename__ = "related_articles"
+
+    article_id = Column(Integer, ForeignKey("articles.id", ondelete="CASCADE"), primary_key=True)
+    related_id = Column(Integer, ForeignKey("articles.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        Index('ix_related_articles_article_id_score', 'article_id', 'score'),
+        Index('ix_related_articles_related_id', 'related_id'),
+    )
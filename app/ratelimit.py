@@ -0,0 +1,162 @@
+import asyncio
+import math
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+from sqlalchemy import event
+
+
+PERIODS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+
+
+def parse_rate(value: str):
+    count, period = value.split("/")
+    return int(count), PERIODS[period.strip()]
+
+
+class MemoryBucketStore:
+    # Хранилище token bucket в памяти процесса. Другое хранилище (например, Redis)
+    # подключается через RateLimiter(store=...) и должно реализовать take().
+    def __init__(self, cleanup_interval: float = 60.0):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._cleanup_interval = cleanup_interval
+        self._next_cleanup = time.monotonic() + cleanup_interval
+
+    def take(self, key: str, rate: float, capacity: int, cost: float = 1.0) -> float:
+        # Возвращает 0, если токен выдан, иначе - через сколько секунд повторить.
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_cleanup:
+                self._cleanup(now)
+
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, 0.0))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            refill_time = capacity / rate
+
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now, refill_time)
+                return 0.0
+
+            self._buckets[key] = (tokens, now, refill_time)
+            return (cost - tokens) / rate
+
+    def _cleanup(self, now: float):
+        # Корзины, которые успели наполниться целиком, ничем не отличаются от новых.
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if now - bucket[1] < bucket[2]
+        }
+        self._next_cleanup = now + self._cleanup_interval
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimiter:
+    def __init__(self, store=None, user_key: Optional[Callable[[Request], Optional[str]]] = None):
+        self.store = store or MemoryBucketStore()
+        self.user_key = user_key
+
+    def limit(self, scope: str, rate: str):
+        count, period = parse_rate(rate)
+
+        async def dependency(request: Request):
+            if count <= 0:
+                return
+
+            keys = [f"{scope}:ip:{client_ip(request)}"]
+            if self.user_key:
+                user = self.user_key(request)
+                if user:
+                    keys.append(f"{scope}:user:{user}")
+
+            for key in keys:
+                retry_after = self.store.take(key, count / period, count)
+                if retry_after:
+                    raise HTTPException(
+                        status_code=429,
+                        detail="Слишком много запросов, попробуйте позже",
+                        headers={"Retry-After": str(math.ceil(retry_after))}
+                    )
+
+        return dependency
+
+
+class _Reservation:
+    def __init__(self):
+        self.used = False
+
+
+_reservation: ContextVar[Optional[_Reservation]] = ContextVar("admission_reservation", default=None)
+
+
+class AdmissionController:
+    # Пускает запрос, только пока в пуле соединений есть свободное место: занятые
+    # соединения всех запросов (и читающих тоже) плюс резервы уже пущенных, но еще
+    # не взявших соединение. Если место не освободилось за timeout, запрос сразу
+    # получает 503, а не ждет соединения в пуле все DB_POOL_TIMEOUT секунд.
+    def __init__(self, engine, capacity: int, timeout: float, poll_interval: float = 0.01):
+        self.engine = engine
+        self.capacity = capacity
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._reserved = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "checkout", self._on_checkout)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        reservation = _reservation.get()
+        if reservation is not None and not reservation.used:
+            self._release(reservation)
+
+    def _try_reserve(self) -> Optional[_Reservation]:
+        with self._lock:
+            if self.engine.pool.checkedout() + self._reserved >= self.capacity:
+                return None
+            self._reserved += 1
+        return _Reservation()
+
+    def _release(self, reservation: _Reservation):
+        with self._lock:
+            if not reservation.used:
+                reservation.used = True
+                self._reserved -= 1
+
+    def admit(self, timeout: Optional[float] = None):
+        wait = self.timeout if timeout is None else timeout
+
+        async def dependency():
+            if self.capacity <= 0:
+                yield
+                return
+
+            deadline = time.monotonic() + wait
+            reservation = self._try_reserve()
+            while reservation is None:
+                if time.monotonic() >= deadline:
+                    raise HTTPException(
+                        status_code=503,
+                        detail="Сервер перегружен, попробуйте позже",
+                        headers={"Retry-After": "1"}
+                    )
+                await asyncio.sleep(self.poll_interval)
+                reservation = self._try_reserve()
+
+            token = _reservation.set(reservation)
+            try:
+                yield
+            finally:
+                _reservation.reset(token)
+                self._release(reservation)
+
+        return dependency
@@ -0,0 +1,188 @@
+import heapq
+import os
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.orm import Session
+
+from app.models import Article, Like, RelatedArticle, article_tags
+
+
+RELATED_LIMIT = int(os.getenv("RELATED_LIMIT", "5"))
+RELATED_TOP_K = int(os.getenv("RELATED_TOP_K", "10"))
+# Сколько соседей по тегу (или по лайкам пользователя) учитывается с каждой
+# стороны от статьи: популярный тег не должен связывать статью со всеми остальными.
+RELATED_WINDOW = int(os.getenv("RELATED_WINDOW", "50"))
+TAG_WEIGHT = 2
+LIKE_WEIGHT = 1
+
+
+def get_related_articles(db: Session, article_id: int, limit: int = RELATED_LIMIT):
+    return (
+        db.query(Article.id, Article.title)
+        .join(RelatedArticle, RelatedArticle.related_id == Article.id)
+        .filter(RelatedArticle.article_id == article_id)
+        .order_by(RelatedArticle.score.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def _window(db: Session, column, group_column, group_id, article_id):
+    before = db.execute(
+        select(column)
+        .where(group_column == group_id, column < article_id)
+        .order_by(column.desc())
+        .limit(RELATED_WINDOW)
+    ).scalars().all()
+    after = db.execute(
+        select(column)
+        .where(group_column == group_id, column > article_id)
+        .order_by(column.asc())
+        .limit(RELATED_WINDOW)
+    ).scalars().all()
+    return before + after
+
+
+def _trim(db: Session, article_ids, top_k: int = RELATED_TOP_K):
+    # Как и при полном пересчете, у статьи хранится не больше top_k связей.
+    ranked = (
+        select(
+            RelatedArticle.article_id,
+            RelatedArticle.related_id,
+            func.row_number().over(
+                partition_by=RelatedArticle.article_id,
+                order_by=(RelatedArticle.score.desc(), RelatedArticle.related_id)
+            ).label("rank")
+        )
+        .where(RelatedArticle.article_id.in_(sorted(article_ids)))
+        .subquery()
+    )
+    db.execute(
+        delete(RelatedArticle)
+        .where(tuple_(RelatedArticle.article_id, RelatedArticle.related_id).in_(
+            select(ranked.c.article_id, ranked.c.related_id).where(ranked.c.rank > top_k)
+        ))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _bump(db: Session, article_id: int, neighbors: Counter, sign: int):
+    deltas = {}
+    for related_id, score in neighbors.items():
+        deltas[(article_id, related_id)] = sign * score
+        deltas[(related_id, article_id)] = sign * score
+    if not deltas:
+        return
+    # Строки обновляются в порядке ключа: две транзакции, задевшие одни и те же
+    # пары, берут блокировки в одном порядке и не могут взаимно заблокироваться.
+    deltas = sorted(deltas.items())
+
+    dialect = db.bind.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        stmt = upsert(RelatedArticle).values([
+            {"article_id": a, "related_id": b, "score": score}
+            for (a, b), score in deltas
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[RelatedArticle.article_id, RelatedArticle.related_id],
+            set_={"score": RelatedArticle.score + stmt.excluded.score}
+        ))
+    else:
+        for (a, b), score in deltas:
+            link = db.get(RelatedArticle, (a, b))
+            if link:
+                link.score += score
+            else:
+                db.add(RelatedArticle(article_id=a, related_id=b, score=score))
+        db.flush()
+
+    ids = [article_id, *neighbors]
+    if sign < 0:
+        db.execute(
+            delete(RelatedArticle)
+            .where(RelatedArticle.article_id.in_(ids), RelatedArticle.score <= 0)
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        _trim(db, ids)
+
+
+def update_tag_links(db: Session, article_id: int, tag_ids, sign: int = 1):
+    neighbors = Counter()
+    for tag_id in set(tag_ids):
+        window = _window(db, article_tags.c.article_id, article_tags.c.tag_id, tag_id, article_id)
+        neighbors.update(window * TAG_WEIGHT)
+    neighbors.pop(article_id, None)
+    _bump(db, article_id, neighbors, sign)
+
+
+def update_like_links(db: Session, article_id: int, user_id: int, sign: int = 1):
+    window = _window(db, Like.article_id, Like.user_id, user_id, article_id)
+    neighbors = Counter(window * LIKE_WEIGHT)
+    _bump(db, article_id, neighbors, sign)
+
+
+def _load_postings(db: Session, group_column, article_column, batch_size: int):
+    # group -> отсортированные id статей; статья -> ее группы (теги или пользователи).
+    postings = defaultdict(lambda: array("i"))
+    groups_by_article = defaultdict(lambda: array("i"))
+    result = db.execute(
+        select(group_column, article_column)
+        .order_by(group_column, article_column)
+        .execution_options(yield_per=batch_size)
+    )
+    for group_id, article_id in result:
+        if group_id is None or article_id is None:
+            continue
+        postings[group_id].append(article_id)
+        groups_by_article[article_id].append(group_id)
+    result.close()
+    return postings, groups_by_article
+
+
+def _window_counts(counter: Counter, postings, groups, article_id: int, weight: int):
+    for group_id in groups:
+        posting = postings[group_id]
+        position = bisect_left(posting, article_id)
+        counter.update(posting[max(position - RELATED_WINDOW, 0):position] * weight)
+        counter.update(posting[position + 1:position + 1 + RELATED_WINDOW] * weight)
+
+
+def rebuild_related(db: Session, top_k: int = RELATED_TOP_K, batch_size: int = 10000) -> int:
+    tag_postings, tags_by_article = _load_postings(
+        db, article_tags.c.tag_id, article_tags.c.article_id, batch_size
+    )
+    like_postings, likers_by_article = _load_postings(db, Like.user_id, Like.article_id, batch_size)
+
+    db.execute(delete(RelatedArticle))
+
+    written = 0
+    rows = []
+    for article_id in sorted(tags_by_article.keys() | likers_by_article.keys()):
+        counter = Counter()
+        _window_counts(counter, tag_postings, tags_by_article.get(article_id, ()), article_id, TAG_WEIGHT)
+        _window_counts(counter, like_postings, likers_by_article.get(article_id, ()), article_id, LIKE_WEIGHT)
+        counter.pop(article_id, None)
+
+        for related_id, score in heapq.nlargest(top_k, counter.items(), key=itemgetter(1)):
+            rows.append({"article_id": article_id, "related_id": related_id, "score": score})
+
+        if len(rows) >= batch_size:
+            db.execute(RelatedArticle.__table__.insert(), rows)
+            written += len(rows)
+            rows = []
+
+    if rows:
+        db.execute(RelatedArticle.__table__.insert(), rows)
+        written += len(rows)
+
+    db.commit()
+    return written
@@ -0,0 +1,98 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+
+class ProductionWorker(UvicornWorker):
+    # UvicornWorker запускается с loop="auto" и http="auto":
+    # uvloop и httptools используются, если установлены.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config.timeout_graceful_shutdown = self.cfg.graceful_timeout
+
+
+def post_fork(server, worker):
+    # Соединения, открытые мастером при предзагрузке, не должны делиться между воркерами.
+    from app.database import engine
+    engine.dispose(close=False)
+
+
+class ProductionServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app.main import app
+        return app
+
+
+def default_workers():
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Запуск Мини-Блога в продакшене")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--keepalive", type=int, default=int(os.getenv("KEEPALIVE", "5")))
+    parser.add_argument("--backlog", type=int, default=int(os.getenv("BACKLOG", "2048")))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", "30")))
+    parser.add_argument("--timeout", type=int, default=int(os.getenv("WORKER_TIMEOUT", "60")))
+    args = parser.parse_args(argv)
+
+    workers_explicit = args.workers is not None or "WEB_CONCURRENCY" in os.environ
+    if args.workers is None:
+        args.workers = int(os.getenv("WEB_CONCURRENCY", default_workers()))
+
+    # Размер пула соединений считается в app.database от числа воркеров,
+    # поэтому переменная должна быть выставлена до предзагрузки приложения.
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+
+    from app.database import get_connection_budget, POOL_SIZE, MAX_OVERFLOW
+    budget = get_connection_budget()
+    if 0 < budget < args.workers:
+        if workers_explicit:
+            parser.error(
+                f"воркеров ({args.workers}) больше, чем соединений в DB_CONNECTION_BUDGET ({budget}); "
+                f"уменьшите --workers или увеличьте бюджет"
+            )
+        # Число воркеров по умолчанию (2 * CPU + 1) урезается до бюджета. Пул уже
+        # посчитан для прежнего числа, но доля воркера в обоих случаях - 1 соединение.
+        print(
+            f"Воркеров по умолчанию ({args.workers}) больше, чем DB_CONNECTION_BUDGET ({budget}); "
+            f"запускается {budget}",
+            file=sys.stderr
+        )
+        args.workers = budget
+        os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    print(
+        f"Воркеров: {args.workers}, пул на воркер: {POOL_SIZE}+{MAX_OVERFLOW}, "
+        f"всего соединений с БД: до {args.workers * (POOL_SIZE + MAX_OVERFLOW)}",
+        file=sys.stderr
+    )
+
+    ProductionServer({
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "app.server.ProductionWorker",
+        "preload_app": True,
+        "keepalive": args.keepalive,
+        "backlog": args.backlog,
+        "graceful_timeout": args.graceful_timeout,
+        "timeout": args.timeout,
+        "post_fork": post_fork,
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import asyncio
+import os
+import threading
+import time
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.database import SessionLocal
+from app.models import User, Article, Comment, Like, SiteStat, AuthorStat
+
+
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "10"))
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "3600"))
+# Как часто воркеры проверяют, не пора ли выполнить периодическую задачу.
+PERIODIC_POLL_INTERVAL = 60.0
+RECONCILED_AT_STAT = "stats_reconciled_at"
+# Сколько раз пересчет счетчика повторяется, если тот менялся во время подсчета.
+RECONCILE_ATTEMPTS = 3
+
+COUNTED_MODELS = {
+    "articles": Article,
+    "users": User,
+    "comments": Comment,
+    "likes": Like,
+}
+
+_cache = {}
+_cache_expires_at = 0.0
+_cache_lock = threading.Lock()
+
+
+def insert_missing_stats(db: Session, values: dict):
+    # Строки создаются параллельно всеми воркерами при старте: конфликт по имени
+    # означает, что строку уже создал другой процесс, и ошибкой не считается.
+    if not values:
+        return
+
+    dialect = db.bind.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        db.execute(
+            upsert(SiteStat)
+            .values([{"name": name, "value": value} for name, value in sorted(values.items())])
+            .on_conflict_do_nothing(index_elements=[SiteStat.name])
+        )
+        db.commit()
+    else:
+        for name, value in sorted(values.items()):
+            db.add(SiteStat(name=name, value=value))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+
+
+def claim_periodic_run(db: Session, name: str, interval: float) -> bool:
+    # Периодические задачи запускаются в каждом воркере, а выполняет их тот, кто
+    # первым сдвинет отметку времени: условный UPDATE атомарен в любой БД.
+    now = int(time.time())
+    insert_missing_stats(db, {name: now})
+    claimed = db.execute(
+        update(SiteStat)
+        .where(SiteStat.name == name, SiteStat.value <= now - interval)
+        .values(value=now)
+    ).rowcount
+    db.commit()
+    return claimed == 1
+
+
+def increment_stat(db: Session, name: str, delta: int = 1):
+    # Выполняется в транзакции обработчика: счетчик фиксируется вместе с данными.
+    # Строка общая для всех запросов и заблокирована до коммита, поэтому
+    # обработчики вызывают increment_stat последним, прямо перед db.commit().
+    if delta:
+        db.execute(
+            update(SiteStat)
+            .where(SiteStat.name == name)
+            .values(value=SiteStat.value + delta)
+        )
+
+
+def _counted_in_transaction(db: Session) -> set:
+    # Авторы, чья сводка посчитана целиком в текущей транзакции: подсчет уже
+    # включает ее изменения, и остальные инкременты для них пропускаются.
+    transaction = db.get_transaction()
+    counted = db.info.get("author_stats_counted")
+    if counted is None or counted[0] is not transaction:
+        counted = (transaction, set())
+        db.info["author_stats_counted"] = counted
+    return counted[1]
+
+
+def increment_author_stat(db: Session, user_id: int, name: str, delta: int = 1):
+    if delta and user_id is not None:
+        counted = _counted_in_transaction(db)
+        if user_id in counted:
+            return
+
+        column = getattr(AuthorStat, name)
+        updated = db.execute(
+            update(AuthorStat)
+            .where(AuthorStat.user_id == user_id)
+            .values({column: column + delta})
+        ).rowcount
+        if updated:
+            return
+
+        # Сводки еще нет: считаем ее в этой же транзакции, так что текущее изменение
+        # уже учтено. Если строку успел вставить другой запрос, его подсчет нашего
+        # незакоммиченного изменения не видел - добавляем дельту.
+        if _insert_author_stats(db, user_id):
+            counted.add(user_id)
+        else:
+            db.execute(
+                update(AuthorStat)
+                .where(AuthorStat.user_id == user_id)
+                .values({column: column + delta})
+            )
+
+
+def get_author_stats(db: Session, user_id: int) -> AuthorStat:
+    stat = db.get(AuthorStat, user_id)
+    if stat is None:
+        stat = reconcile_author_stats(db, user_id)
+    return stat
+
+
+def _count_author_stats(db: Session, user_id: int) -> dict:
+    db.flush()
+    articles = db.query(func.count(Article.id)).filter(Article.author_id == user_id).scalar()
+    likes = (
+        db.query(func.count(Like.id))
+        .join(Article, Article.id == Like.article_id)
+        .filter(Article.author_id == user_id)
+        .scalar()
+    )
+    comments = (
+        db.query(func.count(Comment.id))
+        .join(Article, Article.id == Comment.article_id)
+        .filter(Article.author_id == user_id)
+        .scalar()
+    )
+
+    return {"user_id": user_id, "articles": articles, "likes": likes, "comments": comments}
+
+
+def _insert_author_stats(db: Session, user_id: int) -> bool:
+    # Возвращает False, если сводку параллельно создал другой запрос.
+    values = _count_author_stats(db, user_id)
+    dialect = db.bind.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        return db.execute(
+            upsert(AuthorStat).values(values).on_conflict_do_nothing(index_elements=[AuthorStat.user_id])
+        ).rowcount == 1
+
+    try:
+        with db.begin_nested():
+            db.add(AuthorStat(**values))
+        return True
+    except IntegrityError:
+        return False
+
+
+def reconcile_author_stats(db: Session, user_id: int) -> AuthorStat:
+    _insert_author_stats(db, user_id)
+    db.commit()
+    return db.get(AuthorStat, user_id)
+
+
+def invalidate_stats_cache():
+    global _cache_expires_at
+    with _cache_lock:
+        _cache_expires_at = 0.0
+
+
+def get_site_stats(db: Session) -> dict:
+    global _cache, _cache_expires_at
+    now = time.monotonic()
+    with _cache_lock:
+        if now < _cache_expires_at:
+            return _cache
+
+    values = {name: 0 for name in COUNTED_MODELS}
+    for stat in db.query(SiteStat).filter(SiteStat.name.in_(COUNTED_MODELS)).all():
+        values[stat.name] = stat.value
+
+    with _cache_lock:
+        _cache = values
+        _cache_expires_at = now + STATS_CACHE_TTL
+    return values
+
+
+def reconcile_stats(db: Session) -> dict:
+    insert_missing_stats(db, {name: 0 for name in COUNTED_MODELS})
+
+    values = {}
+    for name, model in COUNTED_MODELS.items():
+        for _ in range(RECONCILE_ATTEMPTS):
+            # COUNT(*) идет без блокировок, строка счетчика блокируется только на
+            # короткую проверку и запись. Инкремент, зафиксированный между первым
+            # чтением и блокировкой, мог попасть в подсчет, а мог и не попасть -
+            # такая поправка ненадежна и откладывается до следующей попытки.
+            before = db.execute(select(SiteStat.value).where(SiteStat.name == name)).scalar_one()
+            count = db.query(func.count(model.id)).scalar()
+            db.commit()
+
+            current = db.execute(
+                select(SiteStat.value).where(SiteStat.name == name).with_for_update()
+            ).scalar_one()
+            if current == before and count != current:
+                db.execute(update(SiteStat).where(SiteStat.name == name).values(value=count))
+            db.commit()
+            if current == before:
+                values[name] = count
+                break
+        else:
+            values[name] = current
+    invalidate_stats_cache()
+    return values
+
+
+def ensure_stats(db: Session):
+    existing = {name for (name,) in db.query(SiteStat.name).all()}
+    if set(COUNTED_MODELS) - existing:
+        reconcile_stats(db)
+
+
+def _reconcile_in_new_session():
+    db = SessionLocal()
+    try:
+        if claim_periodic_run(db, RECONCILED_AT_STAT, STATS_RECONCILE_INTERVAL):
+            reconcile_stats(db)
+    finally:
+        db.close()
+
+
+async def reconcile_stats_periodically():
+    while True:
+        await asyncio.sleep(min(STATS_RECONCILE_INTERVAL, PERIODIC_POLL_INTERVAL))
+        try:
+            await run_in_threadpool(_reconcile_in_new_session)
+        except Exception as e:
+            print(f"Ошибка пересчета статистики: {e}")
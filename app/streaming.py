@@ -0,0 +1,55 @@
+from typing import Iterator, Mapping, Optional
+
+from fastapi.templating import Jinja2Templates
+from starlette.background import BackgroundTask
+from starlette.responses import StreamingResponse
+
+
+class StreamingTemplateResponse(StreamingResponse):
+    def __init__(
+            self,
+            templates: Jinja2Templates,
+            name: str,
+            context: dict,
+            status_code: int = 200,
+            headers: Optional[Mapping[str, str]] = None,
+            background: Optional[BackgroundTask] = None,
+            first_chunk_size: int = 1024,
+            chunk_size: int = 65536
+    ):
+        if "request" not in context:
+            raise ValueError('context must include a "request" key')
+
+        self.template = templates.get_template(name)
+        self.context = context
+        self.first_chunk_size = first_chunk_size
+        self.chunk_size = chunk_size
+
+        super().__init__(
+            self._generate(),
+            status_code=status_code,
+            headers=headers,
+            media_type="text/html",
+            background=background
+        )
+
+    def _generate(self) -> Iterator[bytes]:
+        # Jinja отдает шаблон мелкими кусками, поэтому склеиваем их в блоки:
+        # первый блок (<head> и шапка base.html) уходит клиенту сразу,
+        # остальные - порциями по chunk_size.
+        buffer = []
+        buffered = 0
+        limit = self.first_chunk_size
+
+        for piece in self.template.generate(self.context):
+            data = piece.encode("utf-8")
+            buffer.append(data)
+            buffered += len(data)
+            if buffered >= limit:
+                yield b"".join(buffer)
+                buffer = []
+                buffered = 0
+                limit = self.chunk_size
+
+        if buffer:
+            yield b"".join(buffer)
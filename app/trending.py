@@ -0,0 +1,158 @@
+import asyncio
+import math
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import case, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.database import SessionLocal
+from app.models import Article, Comment, Like, SiteStat
+from app.stats import PERIODIC_POLL_INTERVAL, insert_missing_stats
+
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+TRENDING_DECAY_INTERVAL = float(os.getenv("TRENDING_DECAY_INTERVAL", "3600"))
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 2.0
+MIN_SCORE = 1e-3
+
+# Очки хранятся относительно момента последнего пересчета (строка trending_decayed_at
+# в site_stats): событие в момент t добавляет weight * exp((t - reference) / TAU).
+# Так порядок статей всегда точный, а периодический пересчет только переносит
+# точку отсчета, чтобы значения не росли бесконечно.
+TAU = TRENDING_HALF_LIFE_HOURS * 3600 / math.log(2)
+REFERENCE_STAT = "trending_decayed_at"
+
+
+def _timestamp(value) -> float:
+    if value is None:
+        return time.time()
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _lock_reference(db: Session, read: bool = False):
+    return db.execute(
+        select(SiteStat.value)
+        .where(SiteStat.name == REFERENCE_STAT)
+        .with_for_update(read=read)
+    ).scalar()
+
+
+def add_trending_activity(db: Session, article_id: int, weight: float, at=None):
+    # FOR SHARE: пересчет не сдвинет точку отсчета, пока эта транзакция не закоммитится,
+    # а если он уже идет - дельта будет посчитана от новой точки отсчета.
+    reference = _lock_reference(db, read=True)
+    if reference is None:
+        return
+
+    delta = weight * math.exp((_timestamp(at) - reference) / TAU)
+    db.execute(
+        update(Article)
+        .where(Article.id == article_id)
+        .values(trending_score=Article.trending_score + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def decay_trending(db: Session, min_interval: float = 0) -> bool:
+    now = int(time.time())
+    reference = db.get(SiteStat, REFERENCE_STAT)
+    if reference is None:
+        ensure_trending(db)
+        return False
+
+    previous = reference.value
+    if now - previous < min_interval:
+        db.rollback()
+        return False
+
+    # Точка отсчета сдвигается условным UPDATE: из воркеров, проснувшихся
+    # одновременно, пересчет выполняет только первый.
+    claimed = db.execute(
+        update(SiteStat)
+        .where(SiteStat.name == REFERENCE_STAT, SiteStat.value == previous)
+        .values(value=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if claimed != 1:
+        db.rollback()
+        return False
+
+    factor = math.exp(-(now - previous) / TAU)
+    decayed = Article.trending_score * factor
+    db.execute(
+        update(Article)
+        .where(Article.trending_score != 0)
+        .values(trending_score=case((decayed < MIN_SCORE, 0.0), else_=decayed))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return True
+
+
+def rebuild_trending(db: Session, batch_size: int = 10000) -> int:
+    ensure_trending(db)
+    # Блокировка точки отсчета на все время пересчета: лайки и комментарии ждут
+    # его окончания и считают свои дельты уже от новой точки отсчета.
+    _lock_reference(db)
+    now = int(time.time())
+    # Активность старше десяти TAU (~7 периодов полураспада) дает меньше 0.1% веса.
+    since = datetime.fromtimestamp(now - 10 * TAU, timezone.utc)
+
+    scores = defaultdict(float)
+    for model, weight in ((Like, LIKE_WEIGHT), (Comment, COMMENT_WEIGHT)):
+        result = db.execute(
+            select(model.article_id, model.created_at)
+            .where(model.created_at >= since)
+            .execution_options(yield_per=batch_size)
+        )
+        for article_id, created_at in result:
+            scores[article_id] += weight * math.exp((_timestamp(created_at) - now) / TAU)
+        result.close()
+
+    db.execute(
+        update(Article)
+        .where(Article.trending_score != 0)
+        .values(trending_score=0.0)
+        .execution_options(synchronize_session=False)
+    )
+    rows = [
+        {"id": article_id, "trending_score": score}
+        for article_id, score in scores.items()
+        if article_id is not None and score >= MIN_SCORE
+    ]
+    if rows:
+        db.execute(update(Article), rows)
+
+    db.execute(update(SiteStat).where(SiteStat.name == REFERENCE_STAT).values(value=now))
+    db.commit()
+    return len(rows)
+
+
+def ensure_trending(db: Session):
+    # Только создает точку отсчета; полный пересчет по существующим лайкам
+    # и комментариям - python -m app.cli rebuild-trending.
+    insert_missing_stats(db, {REFERENCE_STAT: int(time.time())})
+
+
+def _decay_in_new_session():
+    db = SessionLocal()
+    try:
+        decay_trending(db, TRENDING_DECAY_INTERVAL)
+    finally:
+        db.close()
+
+
+async def decay_trending_periodically():
+    while True:
+        await asyncio.sleep(min(TRENDING_DECAY_INTERVAL, PERIODIC_POLL_INTERVAL))
+        try:
+            await run_in_threadpool(_decay_in_new_session)
+        except Exception as e:
+            print(f"Ошибка пересчета трендов: {e}")